@@ -1,7 +1,6 @@
 import asyncio
 import requests
 from bs4 import BeautifulSoup
-import schedule
 from datetime import datetime, timezone, timedelta
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
@@ -13,6 +12,7 @@ import logging
 import sys
 import random
 import aiohttp
+import contextvars
 
 # Проверка наличия pytz
 try:
@@ -36,10 +36,24 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")
 PRAYER_URL = "https://qmdi.ru/raspisanie-namazov/"
 SUBSCRIBERS_FILE = "./subscribers.json"  # Явный путь в корне проекта
+# Ответ на команду в теле webhook-ответа вместо отдельного запроса sendMessage
+WEBHOOK_REPLY = os.getenv("WEBHOOK_REPLY", "").lower() in ("1", "true", "yes")
+# Канал для публикации уведомлений (например, @prayer_times); личные сообщения — только по /dm
+CHANNEL_ID = os.getenv("CHANNEL_ID")
+CHANNEL_URL = os.getenv("CHANNEL_URL") or (
+    f"https://t.me/{CHANNEL_ID[1:]}" if CHANNEL_ID and CHANNEL_ID.startswith("@") else None
+)
+DM_SUBSCRIBERS_FILE = "./dm_subscribers.json"  # Подписчики личных уведомлений в режиме канала
+CHANNEL_NOTIFIED_FILE = "./channel_notified.json"  # Прежние подписчики, получившие ссылку на канал
+PRAYER_TZ = "Europe/Moscow"  # Часовой пояс расписания qmdi.ru
+UPDATE_TIME = "00:01"  # Местное время ежедневного обновления расписания (сайт обновляется после полуночи)
+UPDATE_RETRY_DELAY = 5 * 60  # Пауза перед повторной загрузкой неизменившегося расписания, с
+UPDATE_RETRIES = 3  # Число повторных загрузок неизменившегося расписания
+SCHEDULER_MAX_SLEEP = 60  # Максимальная пауза цикла планировщика, с
 
 # Проверка переменных окружения
-logging.info("Проверка переменных окружения: BOT_TOKEN=%s, WEBHOOK_URL=%s, PORT=%s",
-             "set" if BOT_TOKEN else "not set", WEBHOOK_URL, os.getenv("PORT"))
+logging.info("Проверка переменных окружения: BOT_TOKEN=%s, WEBHOOK_URL=%s, PORT=%s, WEBHOOK_REPLY=%s, CHANNEL_ID=%s",
+             "set" if BOT_TOKEN else "not set", WEBHOOK_URL, os.getenv("PORT"), WEBHOOK_REPLY, CHANNEL_ID)
 
 # Инициализация FastAPI
 app = FastAPI()
@@ -52,6 +66,55 @@ prayer_times = {}
 islamic_date = {"day": "", "month": "", "year": ""}
 subscribers = set()
 
+class Clock:
+    """Системные часы планировщика (в симуляции заменяются виртуальными)"""
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    async def sleep(self, seconds: float, wake: asyncio.Event = None):
+        """Пауза на seconds секунд; прерывается раньше, если установлено событие wake"""
+        if wake is None:
+            await asyncio.sleep(seconds)
+            return
+        try:
+            await asyncio.wait_for(wake.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+class Scheduler:
+    """Планировщик разовых задач на заданный момент UTC"""
+
+    def __init__(self, clock: Clock):
+        self.clock = clock
+        self.jobs = []  # (время запуска UTC, тег, функция), по возрастанию времени
+        self.wake = asyncio.Event()  # Будит цикл планировщика при добавлении задачи
+
+    def at(self, run_at: datetime, job, tag: str):
+        self.jobs.append((run_at, tag, job))
+        self.jobs.sort(key=lambda j: j[0])
+        self.wake.set()
+
+    def clear(self, tag: str = None):
+        self.jobs = [j for j in self.jobs if tag is not None and j[1] != tag]
+
+    def idle_seconds(self):
+        if not self.jobs:
+            return None
+        return max(0.0, (self.jobs[0][0] - self.clock.now()).total_seconds())
+
+    def run_pending(self):
+        now = self.clock.now()
+        while self.jobs and self.jobs[0][0] <= now:
+            _, _, job = self.jobs.pop(0)
+            job()
+
+clock = Clock()
+scheduler = Scheduler(clock)
+
+# Ответ, отложенный до webhook-ответа текущего обновления (None — режим выключен)
+webhook_reply = contextvars.ContextVar("webhook_reply", default=None)
+
 # Список хадисов из Сахих аль-Бухари и Сахих Муслима (на русском)
 HADITHS = [
     {
@@ -295,32 +358,107 @@ REPLY_KEYBOARD = ReplyKeyboardMarkup([
     [KeyboardButton("Связаться с разработчиком"), KeyboardButton("Азкары")],
 ], resize_keyboard=True, one_time_keyboard=False)
 
+async def reply(update: Update, text: str, reply_markup=REPLY_KEYBOARD):
+    """Ответ пользователю: первый ответ на обновление уходит в теле webhook-ответа, остальные — обычным sendMessage"""
+    pending = webhook_reply.get()
+    if pending is None:
+        await update.message.reply_text(text, reply_markup=reply_markup)
+        return
+    if not pending:
+        pending.update({
+            "method": "sendMessage",
+            "chat_id": update.effective_chat.id,
+            "text": text,
+            "reply_markup": reply_markup
+        })
+        # Как reply_text: в группах ответ цитирует исходное сообщение
+        if update.effective_chat.type != "private":
+            pending["reply_to_message_id"] = update.message.message_id
+        logging.info("Ответ %s отложен до webhook-ответа", update.effective_chat.id)
+        return
+    # Несколько сообщений: отправляем отложенный ответ сразу, чтобы сохранить порядок
+    webhook_reply.set(None)
+    params = {k: v for k, v in pending.items() if k != "method"}
+    await ptb.bot.send_message(**params)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+def subscribers_file():
+    """Файл подписчиков: в режиме канала — только согласившиеся на личные уведомления через /dm"""
+    return DM_SUBSCRIBERS_FILE if CHANNEL_ID else SUBSCRIBERS_FILE
+
 def load_subscribers():
     """Загрузка подписчиков из файла"""
     global subscribers
-    logging.info("Загрузка подписчиков из %s", SUBSCRIBERS_FILE)
+    path = subscribers_file()
+    logging.info("Загрузка подписчиков из %s", path)
     try:
-        if os.path.exists(SUBSCRIBERS_FILE):
-            with open(SUBSCRIBERS_FILE, "r") as f:
+        if os.path.exists(path):
+            with open(path, "r") as f:
                 subscribers = set(json.load(f))
             logging.info("Подписчики загружены: %s", subscribers)
         else:
             logging.info("Файл подписчиков не существует, создается новый")
             save_subscribers()  # Создаем пустой файл
+        if CHANNEL_ID and os.path.exists(SUBSCRIBERS_FILE):
+            with open(SUBSCRIBERS_FILE, "r") as f:
+                legacy = set(json.load(f)) - subscribers
+            logging.warning(
+                "Режим канала: %s прежних подписчиков из %s переводятся на канал %s, "
+                "личные уведомления — только %s подписчикам /dm",
+                len(legacy), SUBSCRIBERS_FILE, CHANNEL_ID, len(subscribers)
+            )
     except Exception as e:
         logging.error("Ошибка загрузки подписчиков: %s", e)
     return subscribers
 
 def save_subscribers():
     """Сохранение подписчиков в файл"""
-    logging.info("Сохранение подписчиков в %s", SUBSCRIBERS_FILE)
+    path = subscribers_file()
+    logging.info("Сохранение подписчиков в %s", path)
     try:
-        with open(SUBSCRIBERS_FILE, "w") as f:
+        with open(path, "w") as f:
             json.dump(list(subscribers), f)
         logging.info("Подписчики сохранены: %s", subscribers)
     except Exception as e:
         logging.error("Ошибка сохранения подписчиков: %s", e)
 
+def channel_invite_text():
+    """Приглашение в канал с вариантом личных уведомлений"""
+    return (
+        f"Уведомления о намазе публикуются в канале: {CHANNEL_URL}\n"
+        "Если вы предпочитаете получать их в личных сообщениях, "
+        "нажмите «Подписаться на уведомления» или отправьте /dm."
+    )
+
+async def notify_legacy_subscribers():
+    """Однократная рассылка ссылки на канал подписчикам, оформившим подписку до режима канала"""
+    try:
+        legacy = set()
+        if os.path.exists(SUBSCRIBERS_FILE):
+            with open(SUBSCRIBERS_FILE, "r") as f:
+                legacy = set(json.load(f))
+        notified = set()
+        if os.path.exists(CHANNEL_NOTIFIED_FILE):
+            with open(CHANNEL_NOTIFIED_FILE, "r") as f:
+                notified = set(json.load(f))
+    except Exception as e:
+        logging.error("Ошибка загрузки прежних подписчиков: %s", e)
+        return
+    pending = legacy - notified - subscribers
+    logging.info("Рассылка ссылки на канал прежним подписчикам: %s", pending)
+    for chat_id in pending:
+        try:
+            await ptb.bot.send_message(chat_id=chat_id, text=channel_invite_text(), reply_markup=REPLY_KEYBOARD)
+            notified.add(chat_id)
+            logging.info("Ссылка на канал отправлена прежнему подписчику %s", chat_id)
+        except Exception as e:
+            logging.error("Ошибка при отправке ссылки на канал %s: %s", chat_id, e)
+    try:
+        with open(CHANNEL_NOTIFIED_FILE, "w") as f:
+            json.dump(list(notified), f)
+    except Exception as e:
+        logging.error("Ошибка сохранения %s: %s", CHANNEL_NOTIFIED_FILE, e)
+
 async def fetch_prayer_times():
     """Получение времени намаза, восхода солнца и исламской даты с сайта qmdi.ru из блока <div class='date-namaz-main'>"""
     logging.info("Начало парсинга расписания, времени восхода и исламской даты с %s", PRAYER_URL)
@@ -397,15 +535,22 @@ async def fetch_prayer_times():
         return False
 
 async def send_prayer_notification(prayer_name: str, prayer_time: str):
-    """Отправка уведомления о намазе всем подписчикам"""
+    """Отправка уведомления о намазе в канал и подписчикам личных уведомлений"""
     logging.info("Вызов send_prayer_notification: %s на %s", prayer_name, prayer_time)
-    now_msk = datetime.now(timezone(timedelta(hours=3))).strftime("%H:%M:%S")  # MSK
-    now_utc = datetime.now(timezone.utc).strftime("%H:%M:%S")  # UTC
+    now = clock.now()
+    now_msk = now.astimezone(timezone(timedelta(hours=3))).strftime("%H:%M:%S")  # MSK
+    now_utc = now.astimezone(timezone.utc).strftime("%H:%M:%S")  # UTC
     if prayer_name == "Фаджр(Сабах)":
         message = f"{prayer_name}: {prayer_time} | Молитва лучше чем сон! Молитва лучше чем сон! (MSK: {now_msk}, UTC: {now_utc})"
     else:
         message = f"{prayer_name}: {prayer_time} | Спешите на намаз! Спешите к спасению! (MSK: {now_msk}, UTC: {now_utc})"
     logging.info("Отправка уведомления: %s, подписчики: %s", message, subscribers)
+    if CHANNEL_ID:
+        try:
+            await ptb.bot.send_message(chat_id=CHANNEL_ID, text=message)
+            logging.info("Уведомление опубликовано в канале %s: %s", CHANNEL_ID, message)
+        except Exception as e:
+            logging.error("Ошибка публикации в канал %s: %s", CHANNEL_ID, e)
     try:
         for chat_id in subscribers:
             try:
@@ -416,70 +561,143 @@ async def send_prayer_notification(prayer_name: str, prayer_time: str):
     except Exception as e:
         logging.error("Общая ошибка в send_prayer_notification: %s", e)
 
-def schedule_prayer_notifications():
-    """Планирование уведомлений"""
-    schedule.clear()
-    logging.info("Планирование уведомлений")
-    msk_tz = timezone(timedelta(hours=3))
+def local_today():
+    """Текущая дата по часовому поясу расписания"""
+    if PYTZ_AVAILABLE:
+        return clock.now().astimezone(pytz.timezone(PRAYER_TZ)).date()
+    return clock.now().astimezone(timezone(timedelta(hours=3))).date()
+
+def local_to_utc(day, time_str: str) -> datetime:
+    """Перевод местного времени расписания на заданную дату в UTC с учётом перехода на летнее время"""
+    local_time = datetime.strptime(time_str, "%H:%M").replace(year=day.year, month=day.month, day=day.day)
+    if PYTZ_AVAILABLE:
+        tz = pytz.timezone(PRAYER_TZ)
+        return tz.normalize(tz.localize(local_time)).astimezone(timezone.utc)
+    return local_time.replace(tzinfo=timezone(timedelta(hours=3))).astimezone(timezone.utc)
+
+def schedule_prayer_notifications(since: datetime = None):
+    """Планирование уведомлений на сегодня, начиная с момента since (по умолчанию — сейчас)"""
+    scheduler.clear("prayer")
+    day = local_today()
+    since = since or clock.now()
+    logging.info("Планирование уведомлений на %s", day)
     for prayer, time_str in prayer_times.items():
         try:
-            # Конвертируем MSK время в UTC для сервера
-            msk_time = datetime.strptime(time_str, "%H:%M").replace(
-                tzinfo=msk_tz, year=2025, month=5, day=26
-            )
-            utc_time = msk_time.astimezone(timezone.utc).strftime("%H:%M")
-            schedule.every().day.at(utc_time).do(
-                lambda p=prayer, t=time_str: ptb.create_task(send_prayer_notification(p, t))
-            )
-            logging.info("Запланировано: %s на %s MSK (%s UTC)", prayer, time_str, utc_time)
+            utc_time = local_to_utc(day, time_str)
         except ValueError as e:
             logging.error("Ошибка формата времени для %s: %s", prayer, e)
+            continue
+        if utc_time < since:
+            logging.info("Пропущено (время прошло): %s на %s", prayer, time_str)
+            continue
+        scheduler.at(
+            utc_time,
+            lambda p=prayer, t=time_str: ptb.create_task(send_prayer_notification(p, t)),
+            "prayer"
+        )
+        logging.info("Запланировано: %s на %s (%s UTC)", prayer, time_str, utc_time.strftime("%H:%M"))
     logging.info("Все уведомления запланированы: %s", prayer_times)
 
-async def update_prayer_times_daily():
-    """Ежедневное обновление расписания"""
-    logging.info("Ежедневное обновление расписания")
-    if await fetch_prayer_times():
-        schedule_prayer_notifications()
+def schedule_daily_update():
+    """Планирование следующего обновления расписания на UPDATE_TIME по местному времени"""
+    scheduler.clear("update")
+    day = local_today()
+    run_at = local_to_utc(day, UPDATE_TIME)
+    if run_at <= clock.now():
+        run_at = local_to_utc(day + timedelta(days=1), UPDATE_TIME)
+    scheduler.at(run_at, lambda: ptb.create_task(update_prayer_times_daily(run_at)), "update")
+    logging.info("Обновление расписания запланировано на %s UTC", run_at.strftime("%Y-%m-%d %H:%M"))
+
+async def update_prayer_times_daily(run_at: datetime):
+    """Ежедневное обновление расписания; намазы с момента run_at срабатывают, даже если загрузка затянулась"""
+    try:
+        logging.info("Ежедневное обновление расписания")
+        scheduler.clear("retry")
+        previous = dict(prayer_times)
+        if not await fetch_prayer_times():
+            logging.error("Не удалось обновить расписание, используется прежнее")
+        elif prayer_times == previous:
+            logging.warning("Расписание не изменилось со вчерашнего дня, повторная загрузка через %s с", UPDATE_RETRY_DELAY)
+            schedule_update_retry(previous, 1)
+        schedule_prayer_notifications(run_at)
+    finally:
+        schedule_daily_update()
+
+def schedule_update_retry(previous: dict, attempt: int):
+    """Планирование повторной загрузки, если сайт ещё отдаёт вчерашнее расписание"""
+    run_at = clock.now() + timedelta(seconds=UPDATE_RETRY_DELAY)
+    scheduler.at(run_at, lambda: ptb.create_task(retry_prayer_times(previous, attempt, run_at)), "retry")
+
+async def retry_prayer_times(previous: dict, attempt: int, run_at: datetime):
+    """Повторная загрузка расписания; при изменении намазы перепланируются с момента run_at"""
+    logging.info("Повторная загрузка расписания, попытка %s", attempt)
+    if await fetch_prayer_times() and prayer_times != previous:
+        logging.info("Получено новое расписание: %s", prayer_times)
+        schedule_prayer_notifications(run_at)
+    elif attempt < UPDATE_RETRIES:
+        schedule_update_retry(previous, attempt + 1)
     else:
-        logging.error("Не удалось обновить расписание")
+        logging.warning("Расписание не изменилось после %s повторных загрузок", attempt)
+
+async def run_scheduler(max_sleep: float = SCHEDULER_MAX_SLEEP):
+    """Цикл планировщика: запуск наступивших задач и ожидание следующей"""
+    logging.info("Запуск планировщика")
+    while True:
+        try:
+            now = clock.now()
+            now_msk = now.astimezone(timezone(timedelta(hours=3))).strftime("%H:%M:%S")
+            now_utc = now.strftime("%H:%M:%S")
+            logging.debug("Планировщик активен: MSK=%s, UTC=%s", now_msk, now_utc)
+            scheduler.wake.clear()
+            scheduler.run_pending()
+            idle = scheduler.idle_seconds()
+            await clock.sleep(max_sleep if idle is None else min(idle, max_sleep), scheduler.wake)
+        except Exception as e:
+            logging.error("Ошибка в планировщике: %s", e)
+            await clock.sleep(5)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработка команды /start"""
+    """Обработка команды /start: ссылка на канал или подписка на личные уведомления"""
     chat_id = update.effective_chat.id
     logging.info("Команда /start от %s", chat_id)
+    if CHANNEL_ID:
+        await reply(update, channel_invite_text())
+        logging.info("Ссылка на канал отправлена %s", chat_id)
+    else:
+        await subscribe_dm(update, context)
+
+async def subscribe_dm(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработка команды /dm: подписка на личные уведомления"""
+    chat_id = update.effective_chat.id
+    logging.info("Команда /dm от %s", chat_id)
     if chat_id not in subscribers:
         subscribers.add(chat_id)
         save_subscribers()
-        await update.message.reply_text(
-            "ДжазакАллаху хайран! Вы подписались на уведомления о намазе!",
-            reply_markup=REPLY_KEYBOARD
-        )
+        await reply(update, "ДжазакАллаху хайран! Вы подписались на уведомления о намазе!")
         logging.info("Новый подписчик: %s", chat_id)
     else:
-        await update.message.reply_text(
-            "Вы уже подписаны на уведомления.",
-            reply_markup=REPLY_KEYBOARD
-        )
+        await reply(update, "Вы уже подписаны на уведомления.")
         logging.info("Повторная подписка: %s", chat_id)
 
 async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработка команды /stop"""
+    """Обработка команды /stop: отписка от личных уведомлений"""
     chat_id = update.effective_chat.id
     logging.info("Команда /stop от %s", chat_id)
+    # В режиме канала /stop отключает только личные сообщения
+    channel_note = f"\nУведомления из канала {CHANNEL_URL} прекратятся, если вы покинете канал." if CHANNEL_ID else ""
     if chat_id in subscribers:
         subscribers.remove(chat_id)
         save_subscribers()
-        await update.message.reply_text(
-            "Вы отписались от уведомлений.",
-            reply_markup=REPLY_KEYBOARD
-        )
+        if CHANNEL_ID:
+            await reply(update, "Вы отписались от личных уведомлений." + channel_note)
+        else:
+            await reply(update, "Вы отписались от уведомлений.")
         logging.info("Подписчик отписался: %s", chat_id)
+    elif CHANNEL_ID:
+        await reply(update, "Личные уведомления не были включены." + channel_note)
+        logging.info("Попытка отписки без личных уведомлений: %s", chat_id)
     else:
-        await update.message.reply_text(
-            "Вы не подписаны на уведомления.",
-            reply_markup=REPLY_KEYBOARD
-        )
+        await reply(update, "Вы не подписаны на уведомления.")
         logging.info("Попытка отписки неподписанного: %s", chat_id)
 
 async def show_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -498,11 +716,11 @@ async def show_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
         for prayer, time in prayer_times.items():
             schedule_text += f"{prayer}: {time}\n"
         schedule_text += f"\n{hijri_text}"
-        await update.message.reply_text(schedule_text, reply_markup=REPLY_KEYBOARD)
+        await reply(update, schedule_text)
         logging.info("Расписание отправлено %s: %s", chat_id, schedule_text)
     else:
         schedule_text = f"Расписание на сегодня недоступно.\n\n{hijri_text}"
-        await update.message.reply_text(schedule_text, reply_markup=REPLY_KEYBOARD)
+        await reply(update, schedule_text)
         logging.info("Расписание недоступно для %s", chat_id)
 
 async def show_hadith(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -511,7 +729,7 @@ async def show_hadith(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logging.info("Команда /hadith от %s", chat_id)
     hadith = random.choice(HADITHS)
     message = f"Хадис из Сахих аль-Бухари или Сахих Муслима:\n{hadith['text']} ({hadith['reference']})"
-    await update.message.reply_text(message, reply_markup=REPLY_KEYBOARD)
+    await reply(update, message)
     logging.info("Хадис отправлен %s: %s", chat_id, message)
 
 async def show_adhkar(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -522,7 +740,7 @@ async def show_adhkar(update: Update, context: ContextTypes.DEFAULT_TYPE):
     for adhk in ADHKAR:
         adhkar_text += f"• {adhk['text']}\n  Повторять: {adhk['repetition']}\n  Источник: {adhk['source']}\n\n"
     adhkar_text += "Старайтесь читать азкары ежедневно для защиты и благословения!"
-    await update.message.reply_text(adhkar_text, reply_markup=REPLY_KEYBOARD)
+    await reply(update, adhkar_text)
     logging.info("Азкары отправлены %s: %s", chat_id, adhkar_text)
 
 async def show_islamic_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -533,7 +751,7 @@ async def show_islamic_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message = f"Дата: {islamic_date['day']} {islamic_date['month']} {islamic_date['year']} Хиджры"
     else:
         message = "Дата недоступна"
-    await update.message.reply_text(message, reply_markup=REPLY_KEYBOARD)
+    await reply(update, message)
     logging.info("Дата отправлена %s: %s", chat_id, message)
 
 async def contact_developer(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -541,17 +759,14 @@ async def contact_developer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     logging.info("Команда /contact от %s", chat_id)
     message = "Свяжитесь с разработчиком: @ibn_kazim"
-    await update.message.reply_text(message, reply_markup=REPLY_KEYBOARD)
+    await reply(update, message)
     logging.info("Контакт отправлен %s: %s", chat_id, message)
 
 async def show_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка команды /menu для отображения меню"""
     chat_id = update.effective_chat.id
     logging.info("Команда /menu от %s", chat_id)
-    await update.message.reply_text(
-        "Ас-саляму ‘аляйкум уа рахмату-Ллахи уа баракяту",
-        reply_markup=REPLY_KEYBOARD
-    )
+    await reply(update, "Ас-саляму ‘аляйкум уа рахмату-Ллахи уа баракяту")
     logging.info("Меню отправлено %s", chat_id)
 
 async def handle_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -561,7 +776,7 @@ async def handle_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logging.info("Получен текст кнопки от %s: %s", chat_id, text)
     
     if text == "Подписаться на уведомления":
-        await start(update, context)
+        await subscribe_dm(update, context)
     elif text == "Отписаться":
         await stop(update, context)
     elif text == "Расписание намазов":
@@ -573,10 +788,7 @@ async def handle_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif text == "Азкары":
         await show_adhkar(update, context)
     else:
-        await update.message.reply_text(
-            "Пожалуйста, используйте кнопки меню.",
-            reply_markup=REPLY_KEYBOARD
-        )
+        await reply(update, "Пожалуйста, используйте кнопки меню.")
         logging.info("Неизвестный текст от %s: %s", chat_id, text)
 
 async def keep_alive():
@@ -604,8 +816,20 @@ async def process_update(request: Request):
         req = await request.json()
         update = Update.de_json(req, ptb.bot)
         if update:
+            if WEBHOOK_REPLY:
+                webhook_reply.set({})
             await ptb.process_update(update)
             logging.info("Webhook обработан успешно")
+        pending = webhook_reply.get()
+        if pending:
+            # Telegram выполнит этот метод сам; результат его выполнения боту не сообщается
+            logging.info("Ответ передан в теле webhook-ответа: %s", pending["chat_id"])
+            body = dict(pending)
+            if body["reply_markup"] is None:
+                del body["reply_markup"]
+            else:
+                body["reply_markup"] = body["reply_markup"].to_dict()
+            return Response(content=json.dumps(body), media_type="application/json", status_code=HTTPStatus.OK)
         return Response(status_code=HTTPStatus.OK)
     except Exception as e:
         logging.error("Ошибка обработки webhook: %s", e)
@@ -625,7 +849,9 @@ async def get_env():
     return {
         "BOT_TOKEN": "set" if os.getenv("BOT_TOKEN") else "not set",
         "WEBHOOK_URL": os.getenv("WEBHOOK_URL"),
-        "PORT": os.getenv("PORT")
+        "PORT": os.getenv("PORT"),
+        "WEBHOOK_REPLY": WEBHOOK_REPLY,
+        "CHANNEL_ID": CHANNEL_ID
     }
 
 @app.get("/time")
@@ -659,15 +885,16 @@ async def on_startup():
             logging.info("Тестовое расписание: %s", prayer_times)
             logging.info("Тестовая исламская дата: %s", islamic_date)
         schedule_prayer_notifications()
-        schedule.every().day.at("21:01").do(  # Изменено на 21:01 UTC = 00:01 MSK
-            lambda: ptb.create_task(update_prayer_times_daily())
-        )
+        schedule_daily_update()
         if not WEBHOOK_URL:
             logging.error("WEBHOOK_URL не установлен")
             raise ValueError("WEBHOOK_URL не установлен")
         if not BOT_TOKEN:
             logging.error("BOT_TOKEN не установлен")
             raise ValueError("BOT_TOKEN не установлен")
+        if CHANNEL_ID and not CHANNEL_URL:
+            logging.error("CHANNEL_URL не установлен для канала %s", CHANNEL_ID)
+            raise ValueError("CHANNEL_URL не установлен")
         
         await ptb.bot.setWebhook(WEBHOOK_URL)
         logging.info("Webhook установлен: %s", WEBHOOK_URL)
@@ -675,21 +902,10 @@ async def on_startup():
         await ptb.start()
         logging.info("Бот успешно запущен")
 
-        async def run_scheduler():
-            logging.info("Запуск планировщика")
-            while True:
-                try:
-                    now_msk = datetime.now(timezone(timedelta(hours=3))).strftime("%H:%M:%S")
-                    now_utc = datetime.now(timezone.utc).strftime("%H:%M:%S")
-                    logging.debug("Планировщик активен: MSK=%s, UTC=%s", now_msk, now_utc)
-                    schedule.run_pending()
-                    await asyncio.sleep(1)
-                except Exception as e:
-                    logging.error("Ошибка в планировщике: %s", e)
-                    await asyncio.sleep(5)
-        
         ptb.create_task(run_scheduler())
         ptb.create_task(keep_alive())  # Запуск keep_alive
+        if CHANNEL_ID:
+            ptb.create_task(notify_legacy_subscribers())
     except Exception as e:
         logging.error("Ошибка при запуске бота: %s", e)
         raise
@@ -700,16 +916,17 @@ async def on_shutdown():
     logging.info("Остановка бота")
     await ptb.stop()
 
-# Добавление обработчиков команд
-ptb.add_handler(CommandHandler("start", start))
-ptb.add_handler(CommandHandler("stop", stop))
-ptb.add_handler(CommandHandler("schedule", show_schedule))
-ptb.add_handler(CommandHandler("hadith", show_hadith))
-ptb.add_handler(CommandHandler("adhkar", show_adhkar))
-ptb.add_handler(CommandHandler("islamic_date", show_islamic_date))
-ptb.add_handler(CommandHandler("contact", contact_developer))
-ptb.add_handler(CommandHandler("menu", show_menu))
-ptb.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_buttons))
+# Добавление обработчиков команд (только новые сообщения: у постов канала и правок нет update.message)
+ptb.add_handler(CommandHandler("start", start, filters=filters.UpdateType.MESSAGE))
+ptb.add_handler(CommandHandler("dm", subscribe_dm, filters=filters.UpdateType.MESSAGE))
+ptb.add_handler(CommandHandler("stop", stop, filters=filters.UpdateType.MESSAGE))
+ptb.add_handler(CommandHandler("schedule", show_schedule, filters=filters.UpdateType.MESSAGE))
+ptb.add_handler(CommandHandler("hadith", show_hadith, filters=filters.UpdateType.MESSAGE))
+ptb.add_handler(CommandHandler("adhkar", show_adhkar, filters=filters.UpdateType.MESSAGE))
+ptb.add_handler(CommandHandler("islamic_date", show_islamic_date, filters=filters.UpdateType.MESSAGE))
+ptb.add_handler(CommandHandler("contact", contact_developer, filters=filters.UpdateType.MESSAGE))
+ptb.add_handler(CommandHandler("menu", show_menu, filters=filters.UpdateType.MESSAGE))
+ptb.add_handler(MessageHandler(filters.UpdateType.MESSAGE & filters.TEXT & ~filters.COMMAND, handle_buttons))
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,186 @@
+"""Симуляция планировщика уведомлений на виртуальных часах.
+
+Прогоняет run_scheduler через заданное число суток за секунды реального времени:
+расписание берётся из записанного JSON-файла ({"2025-05-26": {"Фаджр(Сабах)": "03:06", ...}})
+или вычисляется синтетически. Проверяет, что каждый намаз срабатывает ровно один раз
+и вовремя, и выводит процессорное время планировщика на одни симулированные сутки.
+
+Примеры:
+    python simulate_schedule.py
+    python simulate_schedule.py --days 365 --tz Europe/Berlin --tz America/New_York
+    python simulate_schedule.py --schedule recorded.json --start 2025-05-26
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+import time
+import warnings
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+os.environ.setdefault("BOT_TOKEN", "123456:SIMULATION")  # Бот не обращается к Telegram
+
+from telegram.warnings import PTBUserWarning
+
+import prayer_bot
+
+# Базовое время намазов (минуты от полуночи) и амплитуда сезонного сдвига
+SYNTHETIC_TIMES = {
+    "Фаджр(Сабах)": (300, 90),
+    "Восход(Догъуш)": (390, 80),
+    "Зухр(Уйле)": (735, 5),
+    "Аср(Экинди)": (930, 60),
+    "Магриб(Акъшам)": (1080, 100),
+    "Иша(Ятсы)": (1170, 100),
+}
+
+
+def synthetic_schedule(day: date) -> dict:
+    """Синтетическое расписание: летом длинный день, зимой короткий"""
+    season = math.cos(2 * math.pi * (day.timetuple().tm_yday - 172) / 365)
+    schedule = {}
+    for prayer, (base, amplitude) in SYNTHETIC_TIMES.items():
+        sign = -1 if base < 735 else 1
+        minutes = int(base + sign * amplitude * season)
+        schedule[prayer] = f"{minutes // 60:02d}:{minutes % 60:02d}"
+    return schedule
+
+
+class VirtualClock(prayer_bot.Clock):
+    """Виртуальные часы: sleep мгновенно переводит время вперёд"""
+
+    def __init__(self, start: datetime, end: datetime):
+        self.current = start
+        self.end = end
+        self.sleeps = 0
+        self.finished = asyncio.Event()
+
+    def now(self) -> datetime:
+        return self.current
+
+    async def sleep(self, seconds: float, wake: asyncio.Event = None):
+        # Даём отработать задачам, созданным планировщиком в текущий момент
+        await asyncio.sleep(0)
+        self.sleeps += 1
+        if wake is not None and wake.is_set():
+            return
+        self.current = min(self.current + timedelta(seconds=seconds), self.end)
+        if self.current >= self.end:
+            self.finished.set()
+            await asyncio.Future()  # Ждём отмены цикла планировщика
+
+
+async def simulate(start: date, days: int, tz_name: str, schedule_for) -> tuple:
+    """Запуск бота и планировщика на виртуальных часах; возвращает сработавшие уведомления"""
+    tz = ZoneInfo(tz_name)
+    begin = datetime.combine(start, datetime.min.time(), tz).astimezone(timezone.utc)
+    end = datetime.combine(start + timedelta(days=days), datetime.min.time(), tz).astimezone(timezone.utc)
+    clock = VirtualClock(begin, end)
+    fired = []
+
+    async def fetch_prayer_times():
+        prayer_bot.prayer_times.clear()
+        prayer_bot.prayer_times.update(schedule_for(prayer_bot.local_today()))
+        return True
+
+    async def send_prayer_notification(prayer_name: str, prayer_time: str):
+        fired.append((prayer_name, prayer_time, clock.now()))
+
+    prayer_bot.PRAYER_TZ = tz_name
+    prayer_bot.clock = clock
+    prayer_bot.scheduler = prayer_bot.Scheduler(clock)
+    prayer_bot.fetch_prayer_times = fetch_prayer_times
+    prayer_bot.send_prayer_notification = send_prayer_notification
+
+    # Как в on_startup: начальное расписание и ежедневное обновление
+    await fetch_prayer_times()
+    prayer_bot.schedule_prayer_notifications()
+    prayer_bot.schedule_daily_update()
+
+    cpu_start = time.process_time()
+    task = asyncio.create_task(prayer_bot.run_scheduler())
+    await clock.finished.wait()
+    task.cancel()
+    cpu = time.process_time() - cpu_start
+    return fired, cpu, clock.sleeps
+
+
+def check(fired: list, start: date, days: int, tz_name: str, schedule_for, tolerance: float) -> list:
+    """Сверка сработавших уведомлений с ожидаемым расписанием"""
+    tz = ZoneInfo(tz_name)
+    expected = {}
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        for prayer, time_str in schedule_for(day).items():
+            local_time = datetime.combine(day, datetime.strptime(time_str, "%H:%M").time(), tz)
+            expected[(day, prayer)] = local_time.astimezone(timezone.utc)
+
+    errors = []
+    counts = Counter()
+    for prayer, time_str, fired_at in fired:
+        key = (fired_at.astimezone(tz).date(), prayer)
+        counts[key] += 1
+        if key not in expected:
+            errors.append(f"Лишнее уведомление: {prayer} в {fired_at.isoformat()}")
+            continue
+        delay = (fired_at - expected[key]).total_seconds()
+        if abs(delay) > tolerance:
+            errors.append(f"{key[0]} {prayer}: ожидалось {expected[key].isoformat()}, "
+                          f"сработало {fired_at.isoformat()} ({delay:+.0f} с)")
+    for key in expected:
+        if counts[key] == 0:
+            errors.append(f"{key[0]} {key[1]}: уведомление не сработало")
+        elif counts[key] > 1:
+            errors.append(f"{key[0]} {key[1]}: сработало {counts[key]} раз")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симуляция планировщика уведомлений о намазе")
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2025, 1, 1),
+                        help="первая симулируемая дата (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=365, help="число симулируемых суток")
+    parser.add_argument("--tz", action="append",
+                        help="часовой пояс расписания (можно несколько; по умолчанию Москва и Берлин с летним временем)")
+    parser.add_argument("--schedule", help="JSON-файл с записанным расписанием по датам")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="допустимое опоздание, с")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    # PTB предупреждает о задачах, созданных при неинициализированном Application
+    warnings.filterwarnings("ignore", category=PTBUserWarning)
+    zones = args.tz or [prayer_bot.PRAYER_TZ, "Europe/Berlin"]
+
+    if args.schedule:
+        with open(args.schedule, "r") as f:
+            recorded = json.load(f)
+        schedule_for = lambda day: recorded.get(day.isoformat(), {})
+    else:
+        schedule_for = synthetic_schedule
+
+    failed = False
+    for tz_name in zones:
+        fired, cpu, sleeps = asyncio.run(simulate(args.start, args.days, tz_name, schedule_for))
+        errors = check(fired, args.start, args.days, tz_name, schedule_for, args.tolerance)
+
+        print(f"Симулировано суток: {args.days} с {args.start} ({tz_name})")
+        print(f"Уведомлений: {len(fired)}, итераций планировщика: {sleeps}")
+        print(f"Процессорное время: {cpu:.3f} с, на сутки: {cpu / args.days * 1000:.3f} мс")
+        for error in errors:
+            print(error)
+        if errors:
+            print(f"Ошибок: {len(errors)}")
+            failed = True
+        else:
+            print("Все уведомления сработали ровно один раз и вовремя")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
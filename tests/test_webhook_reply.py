@@ -0,0 +1,93 @@
+import asyncio
+import json
+import os
+
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")  # Бот не обращается к Telegram
+
+import pytest
+from telegram import Bot, Message
+from telegram.ext import ApplicationHandlerStop, MessageHandler, filters
+
+import prayer_bot
+
+
+class FakeRequest:
+    def __init__(self, data):
+        self.data = data
+
+    async def json(self):
+        return self.data
+
+
+def group_message_update(text, message_id=77):
+    return {
+        "update_id": 1,
+        "message": {
+            "message_id": message_id,
+            "date": 0,
+            "chat": {"id": -5, "type": "group", "title": "Группа"},
+            "from": {"id": 42, "is_bot": False, "first_name": "Тест"},
+            "text": text,
+        },
+    }
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Перехват исходящих запросов к Telegram в порядке отправки"""
+    calls = []
+
+    async def send_message(self, **kwargs):
+        calls.append(("send_message", kwargs))
+
+    async def reply_text(self, text, **kwargs):
+        calls.append(("reply_text", dict(kwargs, text=text)))
+
+    monkeypatch.setattr(Bot, "send_message", send_message)
+    monkeypatch.setattr(Message, "reply_text", reply_text)
+    monkeypatch.setattr(prayer_bot, "WEBHOOK_REPLY", True)
+    monkeypatch.setattr(prayer_bot.ptb, "_initialized", True)
+    return calls
+
+
+@pytest.fixture
+def handler():
+    """Временный обработчик, который вызывает reply() заданное число раз"""
+    texts = []
+
+    async def callback(update, context):
+        for text in texts:
+            await prayer_bot.reply(update, text)
+        raise ApplicationHandlerStop
+
+    h = MessageHandler(filters.Regex("^тест$"), callback)
+    prayer_bot.ptb.add_handler(h, group=-1)
+    yield texts
+    prayer_bot.ptb.remove_handler(h, group=-1)
+
+
+def test_single_reply_returned_in_webhook_response(calls, handler):
+    handler.append("первый")
+    response = asyncio.run(prayer_bot.process_update(FakeRequest(group_message_update("тест"))))
+
+    body = json.loads(response.body)
+    assert calls == []
+    assert body["method"] == "sendMessage"
+    assert body["chat_id"] == -5
+    assert body["text"] == "первый"
+    assert body["reply_to_message_id"] == 77
+    assert body["reply_markup"] == prayer_bot.REPLY_KEYBOARD.to_dict()
+
+
+def test_second_reply_sends_deferred_message_first(calls, handler):
+    handler.extend(["первый", "второй"])
+    response = asyncio.run(prayer_bot.process_update(FakeRequest(group_message_update("тест"))))
+
+    assert response.body == b""
+    assert [name for name, _ in calls] == ["send_message", "reply_text"]
+    deferred = calls[0][1]
+    assert deferred["chat_id"] == -5
+    assert deferred["text"] == "первый"
+    assert deferred["reply_to_message_id"] == 77
+    assert deferred["reply_markup"] is prayer_bot.REPLY_KEYBOARD
+    assert calls[1][1]["text"] == "второй"